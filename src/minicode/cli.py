@@ -1,11 +1,16 @@
 import argparse
+import atexit
+import codecs
+import contextlib
 import difflib
 import getpass
+import io
 import json
 import os
 import platform
-import readline  # noqa: F401
+import select
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
@@ -25,6 +30,19 @@ ORANGE = '\033[33m'
 CYAN = '\033[36m'
 GRAY = '\033[90m'
 
+RESET_BYTES = RESET.encode()
+GRAY_BYTES = GRAY.encode()
+
+DIFF_COLORS = {'-': RED, '+': GREEN, '@': CYAN}
+
+COMPACTED_TOOL_CONTENT = '(content removed to save space in the context window)'
+
+SUCCESS = f'✅ {GREEN}Success{RESET}'
+CONTEXT_COMPACTED = f'⚠️ {ORANGE}Warning: Context compacted.{RESET}'
+
+JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, check_circular=False)
+JSON_DECODER = json.JSONDecoder()
+
 
 def confirm(message, default=True):
     prompt = f'{message} [{"Y/n" if default else "y/N"}] '
@@ -38,41 +56,158 @@ def confirm(message, default=True):
             return user_input == 'y'
 
 
+def split_lines(text):
+    # Split on '\n' only, the same way readlines() splits a file opened in text mode.
+    return io.StringIO(text).readlines()
+
+
 class Diff:
     def __init__(self, old_content, new_content, old_file, new_file):
+        self._plain = None
+        self._colorized = None
+
+        if old_content == new_content:
+            self._diff = []
+            return
+
+        if isinstance(old_content, str):
+            old_content = split_lines(old_content)
+
+        if isinstance(new_content, str):
+            new_content = split_lines(new_content)
+
         self._diff = list(difflib.unified_diff(
-            old_content.splitlines(keepends=True),
-            new_content.splitlines(keepends=True),
+            old_content,
+            new_content,
             fromfile=old_file,
             tofile=new_file,
         ))
 
+    @classmethod
+    def from_lines(cls, old_lines, new_lines, old_file, new_file):
+        return cls(old_lines, new_lines, old_file, new_file)
+
     def plain(self):
-        return ''.join(self._diff)
+        if self._plain is None:
+            self._plain = ''.join(self._diff)
+
+        return self._plain
 
     def colorized(self):
-        result_lines = []
-
-        for line in self._diff:
-            if line.startswith('---') or line.startswith('+++'):
-                result_lines.append(f'{BOLD}{line}{RESET}')
-            elif line.startswith('@@'):
-                result_lines.append(f'{CYAN}{line}{RESET}')
-            elif line.startswith('-'):
-                result_lines.append(f'{RED}{line}{RESET}')
-            elif line.startswith('+'):
-                result_lines.append(f'{GREEN}{line}{RESET}')
-            else:
-                result_lines.append(line)
+        if self._colorized is None:
+            result = io.StringIO()
+
+            for i, line in enumerate(self._diff):
+                # unified_diff() always emits the ---/+++ file headers as the first two lines.
+                color = BOLD if i < 2 else DIFF_COLORS.get(line[:1])
 
-        return ''.join(result_lines)
+                if color is None:
+                    result.write(line)
+                else:
+                    result.write(color)
+                    result.write(line)
+                    result.write(RESET)
+
+            self._colorized = result.getvalue()
+
+        return self._colorized
 
 
 class ToolError(Exception):
     pass
 
 
-class BashTool:
+def check_file(file_path, mode):
+    if not os.path.isabs(file_path):
+        raise ToolError('file_path must be an absolute path.')
+
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        raise ToolError('file_path does not exist.')
+
+    if not stat.S_ISREG(st.st_mode):
+        raise ToolError('file_path is not a regular file.')
+
+    if not os.access(file_path, mode):
+        if mode & os.R_OK and not os.access(file_path, os.R_OK):
+            raise ToolError('file_path is not readable.')
+
+        raise ToolError('file_path is not writable.')
+
+
+class ThreadStdout:
+    # Sends what a ToolThread prints to its output buffer instead of the terminal.
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def write(self, text):
+        return getattr(threading.current_thread(), 'output', self._stream).write(text)
+
+    def flush(self):
+        getattr(threading.current_thread(), 'output', self._stream).flush()
+
+
+class ToolThread(threading.Thread):
+    # Daemon, so a call abandoned by Ctrl+C never holds up exit.
+
+    def __init__(self, tool, arguments):
+        super().__init__(daemon=True)
+        self.output = io.StringIO()
+        self._tool = tool
+        self._arguments = arguments
+        self._result = None
+        self._error = None
+
+    def run(self):
+        try:
+            self._result = self._tool(**self._arguments)
+        except Exception as e:
+            self._error = e
+
+    def result(self):
+        self.join()
+        print(self.output.getvalue(), end='', flush=True)
+
+        if self._error is not None:
+            raise self._error
+
+        return self._result
+
+
+class Tool:
+    # Read-only tools may run concurrently when permission prompts are skipped.
+    read_only = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls.name = cls.definition['function']['name']
+        cls.parameters = cls.definition['function']['parameters']
+
+        validator_class = jsonschema.validators.validator_for(cls.parameters)
+        validator_class.check_schema(cls.parameters)
+        cls.validator = validator_class(cls.parameters)
+
+    def parse_arguments(self, arguments):
+        try:
+            arguments = JSON_DECODER.decode(arguments)
+        except json.JSONDecodeError as e:
+            raise ToolError(f'Invalid arguments: {e}')
+
+        try:
+            self.validator.validate(arguments)
+        except jsonschema.ValidationError as e:
+            raise ToolError(f'Invalid arguments: {e.message}')
+
+        return arguments
+
+
+class BashTool(Tool):
     definition = {
         'type': 'function',
         'function': {
@@ -109,10 +244,12 @@ class BashTool:
         if not os.path.isabs(cwd):
             raise ToolError('cwd must be an absolute path.')
 
-        if not os.path.exists(cwd):
+        try:
+            st = os.stat(cwd)
+        except OSError:
             raise ToolError('cwd does not exist.')
 
-        if not os.path.isdir(cwd):
+        if not stat.S_ISDIR(st.st_mode):
             raise ToolError('cwd is not a directory.')
 
         print(command, flush=True)
@@ -129,52 +266,82 @@ class BashTool:
                 else:
                     raise ToolError('User rejected.')
 
-        try:
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                executable=self._bash_path,
-                stdin=subprocess.DEVNULL,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                cwd=cwd,
-            )
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            executable=self._bash_path,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+        )
 
-            output_lines = []
+        with process:
+            fd = process.stdout.fileno()
+            decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')('replace'), translate=True)
+            deadline = time.monotonic() + timeout
+            output_parts = []
+            output_file = None
+            total_lines = 0
+            total_chars = 0
+            partial_line = False
 
-            def read_stream(stream, collected):
-                for line in stream:
-                    print(f'{GRAY}{line}{RESET}', end='', flush=True)
-                    collected.append(line)
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
 
-            thread = threading.Thread(target=read_stream, args=(process.stdout, output_lines))
-            thread.start()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(command, timeout)
 
-            process.wait(timeout=timeout)
-            thread.join()
-        except subprocess.TimeoutExpired:
-            process.kill()
-            thread.join()
+                    if not select.select([fd], [], [], remaining)[0]:
+                        continue
 
-            raise ToolError(f'Timed out after {timeout} second(s).')
+                    data = os.read(fd, 65536)
+                    text = decoder.decode(data, final=not data)
 
-        output_content = ''.join(output_lines)
+                    if text:
+                        print(f'{GRAY}{text}{RESET}', end='', flush=True)
 
-        if len(output_content) > 65536:
-            with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', delete=False, suffix='.txt') as f:
-                f.write(output_content)
-                output_file_path = f.name
+                        total_lines += text.count('\n')
+                        total_chars += len(text)
+                        partial_line = not text.endswith('\n')
+
+                        if output_file is not None:
+                            output_file.write(text)
+                        else:
+                            output_parts.append(text)
 
+                            if total_chars > 65536:
+                                output_file = tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', delete=False, suffix='.txt')
+                                output_file.writelines(output_parts)
+                                output_parts.clear()
+
+                    if not data:
+                        break
+
+                process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+                if output_file is not None:
+                    output_file.close()
+                    os.remove(output_file.name)
+
+                raise ToolError(f'Timed out after {timeout} second(s).')
+            finally:
+                if output_file is not None:
+                    output_file.close()
+
+        if output_file is not None:
             output = {
-                'file_path': output_file_path,
-                'total_lines': len(output_lines),
-                'total_chars': len(output_content),
+                'file_path': output_file.name,
+                'total_lines': total_lines + partial_line,
+                'total_chars': total_chars,
             }
         else:
-            output = {'content': output_content}
+            output = {'content': ''.join(output_parts)}
 
-        print(f'✅ {GREEN}Success{RESET}', flush=True)
+        print(SUCCESS, flush=True)
 
         return {
             'output': output,
@@ -182,7 +349,7 @@ class BashTool:
         }
 
 
-class ReadTool:
+class ReadTool(Tool):
     definition = {
         'type': 'function',
         'function': {
@@ -221,31 +388,45 @@ Results are returned using cat -n format, with line numbers starting at 1.''',
         },
     }
 
+    read_only = True
+
     def __init__(self, skip_permissions=False):
         self._skip_permissions = skip_permissions
 
     def __call__(self, file_path, offset=1, limit=1000, chars_limit=65536):
-        if not os.path.isabs(file_path):
-            raise ToolError('file_path must be an absolute path.')
+        check_file(file_path, os.R_OK)
 
-        if not os.path.exists(file_path):
-            raise ToolError('file_path does not exist.')
+        lines = []
+        total_lines = 0
+        total_chars = 0
 
-        if not os.path.isfile(file_path):
-            raise ToolError('file_path is not a regular file.')
+        with open(file_path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                total_lines += 1
+                total_chars += len(line)
 
-        if not os.access(file_path, os.R_OK):
-            raise ToolError('file_path is not readable.')
+                if total_lines >= offset:
+                    lines.append(line)
 
-        with open(file_path, mode='r', encoding='utf-8') as f:
-            full_lines = f.readlines()
+                    if len(lines) == limit:
+                        break
+
+            partial_line = False
+
+            while True:
+                chunk = f.read(1 << 20)
 
-        full_content = ''.join(full_lines)
+                if not chunk:
+                    break
 
-        lines = full_lines[offset - 1:]
+                total_lines += chunk.count('\n')
+                total_chars += len(chunk)
+                partial_line = not chunk.endswith('\n')
 
-        if len(lines) > limit:
-            lines = lines[:limit] + [f'... (truncated to {limit} lines)\n']
+            total_lines += partial_line
+
+        if total_lines - offset + 1 > limit:
+            lines.append(f'... (truncated to {limit} lines)\n')
 
         content = ''.join(lines)
 
@@ -254,7 +435,7 @@ Results are returned using cat -n format, with line numbers starting at 1.''',
 
         result_content = ''.join(f'{offset+i:>6}\t{line}' for i, line in enumerate(content.splitlines(keepends=True)))
 
-        print(f'{file_path} (lines {offset}-{min(offset + limit - 1, len(full_lines))})', flush=True)
+        print(f'{file_path} (lines {offset}-{min(offset + limit - 1, total_lines)})', flush=True)
 
         if not self._skip_permissions:
             if not confirm('❓ Do you want to proceed?'):
@@ -265,16 +446,16 @@ Results are returned using cat -n format, with line numbers starting at 1.''',
                 else:
                     raise ToolError('User rejected.')
 
-        print(f'✅ {GREEN}Success{RESET}', flush=True)
+        print(SUCCESS, flush=True)
 
         return {
             'content': result_content,
-            'total_lines': len(full_lines),
-            'total_chars': len(full_content),
+            'total_lines': total_lines,
+            'total_chars': total_chars,
         }
 
 
-class WriteTool:
+class WriteTool(Tool):
     definition = {
         'type': 'function',
         'function': {
@@ -316,56 +497,70 @@ class WriteTool:
         if not os.access(parent_dir, os.W_OK):
             raise ToolError('dirname(file_path) is not writable.')
 
-        if not os.path.exists(file_path):
-            diff = Diff(
-                old_content='',
-                new_content=content,
-                old_file='/dev/null',
-                new_file=file_path,
-            )
-        else:
-            if not overwrite:
-                raise ToolError('file_path already exists and overwrite is false.')
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            st = None
+
+        with contextlib.ExitStack() as stack:
+            f = None
+
+            if st is None:
+                diff = Diff(
+                    old_content='',
+                    new_content=content,
+                    old_file='/dev/null',
+                    new_file=file_path,
+                )
+            else:
+                if not overwrite:
+                    raise ToolError('file_path already exists and overwrite is false.')
 
-            if not os.path.isfile(file_path):
-                raise ToolError('file_path already exists and is not a regular file.')
+                if not stat.S_ISREG(st.st_mode):
+                    raise ToolError('file_path already exists and is not a regular file.')
 
-            if not os.access(file_path, os.W_OK):
-                raise ToolError('file_path already exists and is not writable.')
+                if not os.access(file_path, os.W_OK):
+                    raise ToolError('file_path already exists and is not writable.')
 
-            old_content = ''
+                old_lines = []
+                new_lines = split_lines(content)
 
-            if os.access(file_path, os.R_OK):
-                with open(file_path, mode='r', encoding='utf-8') as f:
-                    old_content = f.read()
+                if os.access(file_path, os.R_OK):
+                    f = stack.enter_context(open(file_path, mode='r+', encoding='utf-8'))
+                    old_lines = f.readlines()
 
-            diff = Diff(
-                old_content=old_content,
-                new_content=content,
-                old_file=file_path,
-                new_file=file_path,
-            )
+                diff = Diff.from_lines(
+                    old_lines=old_lines,
+                    new_lines=new_lines,
+                    old_file=file_path,
+                    new_file=file_path,
+                )
 
-        print(diff.colorized(), flush=True)
+            print(diff.colorized(), flush=True)
 
-        if not self._skip_permissions:
-            if not confirm('❓ Do you want to proceed?'):
-                user_input = input('📝 Tell the assistant what to do differently (optional): ')
+            if not self._skip_permissions:
+                if not confirm('❓ Do you want to proceed?'):
+                    user_input = input('📝 Tell the assistant what to do differently (optional): ')
 
-                if user_input:
-                    raise ToolError(f'User rejected with message: {user_input}')
-                else:
-                    raise ToolError('User rejected.')
+                    if user_input:
+                        raise ToolError(f'User rejected with message: {user_input}')
+                    else:
+                        raise ToolError('User rejected.')
+
+            if f is None:
+                f = stack.enter_context(open(file_path, mode='w', encoding='utf-8'))
+            else:
+                f.seek(0)
+                f.truncate()
 
-        with open(file_path, mode='w', encoding='utf-8') as f:
             f.write(content)
 
-        print(f'✅ {GREEN}Success{RESET}', flush=True)
+        print(SUCCESS, flush=True)
 
         return {'success': True}
 
 
-class EditTool:
+class EditTool(Tool):
     definition = {
         'type': 'function',
         'function': {
@@ -397,54 +592,60 @@ class EditTool:
         self._skip_permissions = skip_permissions
 
     def __call__(self, file_path, old_string, new_string):
-        if not os.path.isabs(file_path):
-            raise ToolError('file_path must be an absolute path.')
+        check_file(file_path, os.R_OK | os.W_OK)
 
-        if not os.path.exists(file_path):
-            raise ToolError('file_path does not exist.')
+        if old_string == new_string:
+            raise ToolError('new_string is identical to old_string.')
 
-        if not os.path.isfile(file_path):
-            raise ToolError('file_path is not a regular file.')
+        with open(file_path, mode='r+', encoding='utf-8') as f:
+            old_lines = f.readlines()
 
-        if not os.access(file_path, os.R_OK):
-            raise ToolError('file_path is not readable.')
+            if old_string and '\n' not in old_string:
+                matches = [i for i, line in enumerate(old_lines) if old_string in line]
 
-        if not os.access(file_path, os.W_OK):
-            raise ToolError('file_path is not writable.')
+                if not matches:
+                    raise ToolError('old_string not found in file.')
 
-        with open(file_path, mode='r', encoding='utf-8') as f:
-            old_content = f.read()
+                if len(matches) > 1 or old_lines[matches[0]].count(old_string) > 1:
+                    raise ToolError('old_string appears multiple times in file. It must be unique.')
+
+                i = matches[0]
+                new_lines = old_lines.copy()
+                new_lines[i:i + 1] = split_lines(old_lines[i].replace(old_string, new_string, 1))
+            else:
+                old_content = ''.join(old_lines)
 
-        if old_string not in old_content:
-            raise ToolError('old_string not found in file.')
+                if old_string not in old_content:
+                    raise ToolError('old_string not found in file.')
 
-        if old_content.count(old_string) > 1:
-            raise ToolError('old_string appears multiple times in file. It must be unique.')
+                if old_content.count(old_string) > 1:
+                    raise ToolError('old_string appears multiple times in file. It must be unique.')
 
-        new_content = old_content.replace(old_string, new_string, 1)
+                new_lines = split_lines(old_content.replace(old_string, new_string, 1))
 
-        diff = Diff(
-            old_content=old_content,
-            new_content=new_content,
-            old_file=file_path,
-            new_file=file_path,
-        )
+            diff = Diff.from_lines(
+                old_lines=old_lines,
+                new_lines=new_lines,
+                old_file=file_path,
+                new_file=file_path,
+            )
 
-        print(diff.colorized(), flush=True)
+            print(diff.colorized(), flush=True)
 
-        if not self._skip_permissions:
-            if not confirm('❓ Do you want to proceed?'):
-                user_input = input('📝 Tell the assistant what to do differently (optional): ')
+            if not self._skip_permissions:
+                if not confirm('❓ Do you want to proceed?'):
+                    user_input = input('📝 Tell the assistant what to do differently (optional): ')
 
-                if user_input:
-                    raise ToolError(f'User rejected with message: {user_input}')
-                else:
-                    raise ToolError('User rejected.')
+                    if user_input:
+                        raise ToolError(f'User rejected with message: {user_input}')
+                    else:
+                        raise ToolError('User rejected.')
 
-        with open(file_path, mode='w', encoding='utf-8') as f:
-            f.write(new_content)
+            f.seek(0)
+            f.truncate()
+            f.writelines(new_lines)
 
-        print(f'✅ {GREEN}Success{RESET}', flush=True)
+        print(SUCCESS, flush=True)
 
         return {
             'success': True,
@@ -452,7 +653,7 @@ class EditTool:
         }
 
 
-class WebFetchTool:
+class WebFetchTool(Tool):
     definition = {
         'type': 'function',
         'function': {
@@ -471,6 +672,8 @@ class WebFetchTool:
         },
     }
 
+    read_only = True
+
     def __init__(self, client, skip_permissions=False):
         self._client = client
         self._skip_permissions = skip_permissions
@@ -507,11 +710,11 @@ class WebFetchTool:
                 'content': content,
             }
 
-        print(f'✅ {GREEN}Success{RESET}', flush=True)
+        print(SUCCESS, flush=True)
         return result
 
 
-class WebSearchTool:
+class WebSearchTool(Tool):
     definition = {
         'type': 'function',
         'function': {
@@ -533,6 +736,8 @@ class WebSearchTool:
         },
     }
 
+    read_only = True
+
     def __init__(self, client, skip_permissions=False):
         self._client = client
         self._skip_permissions = skip_permissions
@@ -550,31 +755,36 @@ class WebSearchTool:
                     raise ToolError('User rejected.')
 
         response = self._client.search(query=query, max_results=max_results)
-        print(f'✅ {GREEN}Success{RESET}', flush=True)
+        print(SUCCESS, flush=True)
         return response['results']
 
 
+def error_json(message):
+    return '{"error": ' + JSON_ENCODER.encode(message) + '}'
+
+
+def tool_message(tool_call_id, content):
+    return {
+        'role': 'tool',
+        'tool_call_id': tool_call_id,
+        'content': content,
+    }
+
+
 def compact(messages):
     if len(messages) <= 3:
         return messages
 
-    compacted = []
+    recent_count = (len(messages) - 1) // 2
 
-    compacted.append(messages[0])
+    compacted = messages.copy()
 
-    recent_count = (len(messages) - 1) // 2
+    for i in range(1, len(messages) - recent_count):
+        message = messages[i]
 
-    for message in messages[1:-recent_count]:
         if message['role'] == 'tool':
-            compacted.append({
-                'role': 'tool',
-                'tool_call_id': message['tool_call_id'],
-                'content': '(content removed to save space in the context window)',
-            })
-        else:
-            compacted.append(message)
-
-    compacted.extend(messages[-recent_count:])
+            compacted[i] = message.copy()
+            compacted[i]['content'] = COMPACTED_TOOL_CONTENT
 
     return compacted
 
@@ -584,6 +794,25 @@ def main():
     parser.add_argument('--skip-permissions', action='store_true', help='Bypass all permission checks.')
     args = parser.parse_args()
 
+    import readline
+
+    history_file = os.path.expanduser('~/.minicode_history')
+    readline.set_history_length(1000)
+
+    with contextlib.suppress(OSError):
+        readline.read_history_file(history_file)
+
+    def write_history_file():
+        with contextlib.suppress(OSError):
+            readline.write_history_file(history_file)
+
+    atexit.register(write_history_file)
+
+    write = sys.stdout.buffer.write
+    flush = sys.stdout.buffer.flush
+    encoding = sys.stdout.encoding
+    errors = sys.stdout.errors
+
     try:
         print('Welcome to MiniCode! Press Ctrl+C or Ctrl+D to exit.', flush=True)
 
@@ -614,11 +843,17 @@ def main():
             os.environ['MINICODE_CONTEXT_WINDOW'] = user_input or '128000'
 
         try:
-            int(os.environ['MINICODE_CONTEXT_WINDOW'])
+            context_window = int(os.environ['MINICODE_CONTEXT_WINDOW'])
         except ValueError:
             print(f'❌ {RED}Error: MINICODE_CONTEXT_WINDOW must be an integer.{RESET}', flush=True)
             return 1
 
+        if context_window <= 0:
+            print(f'❌ {RED}Error: MINICODE_CONTEXT_WINDOW must be positive.{RESET}', flush=True)
+            return 1
+
+        percentage_per_token = 100 / context_window
+
         if 'TAVILY_BASE_URL' not in os.environ:
             user_input = input('📝 Tavily Base URL [https://api.tavily.com]: ').strip()
             os.environ['TAVILY_BASE_URL'] = user_input or 'https://api.tavily.com'
@@ -656,6 +891,8 @@ def main():
                 'WebSearch': WebSearchTool(client=tavily_client, skip_permissions=args.skip_permissions),
             })
 
+        tool_definitions = [tool.definition for tool in tools.values()]
+
         system_prompt = f'''\
 You are MiniCode, a powerful command-line AI coding agent.
 
@@ -688,36 +925,40 @@ Working Directory: {os.getcwd()}'''
                                 stream = openai_client.chat.completions.create(
                                     model=os.environ['MINICODE_MODEL'],
                                     messages=messages,
-                                    tools=[tool.definition for tool in tools.values()],
+                                    tools=tool_definitions,
                                     stream=True,
                                     stream_options={'include_usage': True},
                                 )
 
                                 has_reasoning_content = False
-                                reasoning_content = ''
+                                reasoning_content_parts = []
                                 has_reasoning_details = False
                                 reasoning_details = []
-                                content = ''
+                                content_parts = []
                                 tool_calls = []
                                 finish_reason = None
                                 usage = None
 
-                                for chunk in stream:
+                                for i, chunk in enumerate(stream, 1):
+                                    if i % 16 == 0:
+                                        flush()
+
                                     if not chunk.choices:
                                         continue
 
                                     delta = chunk.choices[0].delta
 
-                                    if not hasattr(delta, 'reasoning_content'):
-                                        if hasattr(delta, 'reasoning'):
-                                            delta.reasoning_content = delta.reasoning
-
                                     delta_reasoning_content = getattr(delta, 'reasoning_content', None)
 
+                                    if delta_reasoning_content is None:
+                                        delta_reasoning_content = getattr(delta, 'reasoning', None)
+
                                     if delta_reasoning_content is not None:
-                                        print(f'{GRAY}{delta_reasoning_content}{RESET}', end='', flush=True)
+                                        write(GRAY_BYTES)
+                                        write(delta_reasoning_content.encode(encoding, errors))
+                                        write(RESET_BYTES)
                                         has_reasoning_content = True
-                                        reasoning_content += delta_reasoning_content
+                                        reasoning_content_parts.append(delta_reasoning_content)
 
                                     delta_reasoning_details = getattr(delta, 'reasoning_details', None)
 
@@ -725,42 +966,53 @@ Working Directory: {os.getcwd()}'''
                                         has_reasoning_details = True
                                         reasoning_details.extend(delta_reasoning_details)
 
-                                    delta_content = getattr(delta, 'content', None)
+                                    delta_content = delta.content
 
                                     if delta_content:
-                                        if not content:
-                                            if reasoning_content:
-                                                print('\n\n', end='', flush=True)
+                                        if not content_parts:
+                                            if any(reasoning_content_parts):
+                                                write(b'\n\n')
+                                                flush()
 
-                                        print(delta_content, end='', flush=True)
-                                        content += delta_content
+                                        write(delta_content.encode(encoding, errors))
+                                        content_parts.append(delta_content)
 
-                                    delta_tool_calls = getattr(delta, 'tool_calls', None)
+                                    delta_tool_calls = delta.tool_calls
 
                                     if delta_tool_calls:
                                         for tool_call in delta_tool_calls:
-                                            tool_call_id = getattr(tool_call, 'id', None)
+                                            tool_call_id = tool_call.id
 
                                             if tool_call_id is not None:
-                                                print('\n\n', end='', flush=True)
+                                                write(b'\n\n')
+                                                flush()
 
                                                 tool_calls.append({
                                                     'id': tool_call_id,
-                                                    'name': '',
-                                                    'arguments': '',
+                                                    'name': [],
+                                                    'arguments': [],
                                                 })
 
-                                            name = getattr(tool_call.function, 'name', None)
+                                            function = tool_call.function
+
+                                            if function is None:
+                                                continue
+
+                                            name = function.name
 
                                             if name is not None:
-                                                print(f'{GRAY}{name}{RESET}', end='', flush=True)
-                                                tool_calls[-1]['name'] += name
+                                                write(GRAY_BYTES)
+                                                write(name.encode(encoding, errors))
+                                                write(RESET_BYTES)
+                                                tool_calls[-1]['name'].append(name)
 
-                                            arguments = getattr(tool_call.function, 'arguments', None)
+                                            arguments = function.arguments
 
                                             if arguments is not None:
-                                                print(f'{GRAY}{arguments}{RESET}', end='', flush=True)
-                                                tool_calls[-1]['arguments'] += arguments
+                                                write(GRAY_BYTES)
+                                                write(arguments.encode(encoding, errors))
+                                                write(RESET_BYTES)
+                                                tool_calls[-1]['arguments'].append(arguments)
 
                                     if chunk.choices[0].finish_reason is not None:
                                         finish_reason = chunk.choices[0].finish_reason
@@ -768,7 +1020,16 @@ Working Directory: {os.getcwd()}'''
                                     if chunk.usage is not None:
                                         usage = chunk.usage
 
-                                print('\n', end='', flush=True)
+                                write(b'\n')
+                                flush()
+
+                                reasoning_content = ''.join(reasoning_content_parts)
+                                content = ''.join(content_parts)
+
+                                for tool_call in tool_calls:
+                                    tool_call['name'] = ''.join(tool_call['name'])
+                                    tool_call['arguments'] = ''.join(tool_call['arguments'])
+
                                 break
                             except (
                                 httpx.HTTPError,
@@ -828,63 +1089,74 @@ Working Directory: {os.getcwd()}'''
 
                     if usage is not None:
                         tokens = getattr(usage, 'total_tokens', 0)
-                        percentage = (tokens / int(os.environ['MINICODE_CONTEXT_WINDOW'])) * 100
+                        percentage = tokens * percentage_per_token
 
                         print(f'📊 {tokens:,} tokens ({percentage:.2f}%)', flush=True)
 
                         if percentage > 80:
                             messages = compact(messages)
 
-                            print(f'⚠️ {ORANGE}Warning: Context compacted.{RESET}', flush=True)
+                            print(CONTEXT_COMPACTED, flush=True)
 
                     if not tool_calls:
                         break
 
-                    for tool_call in tool_calls:
-                        try:
-                            try:
-                                tool = tools[tool_call['name']]
-                            except KeyError:
-                                raise ToolError('Unknown tool.')
+                    # Start the leading run of read-only tool calls together; results are still collected in order.
+                    batch = []
 
-                            try:
-                                arguments = json.loads(tool_call['arguments'])
-                            except json.JSONDecodeError as e:
-                                raise ToolError(f'Invalid arguments: {e}')
+                    if args.skip_permissions:
+                        for tool_call in tool_calls:
+                            tool = tools.get(tool_call['name'])
+
+                            if tool is None or not tool.read_only:
+                                break
 
                             try:
-                                jsonschema.validate(arguments, tool.definition['function']['parameters'])
-                            except jsonschema.ValidationError as e:
-                                raise ToolError(f'Invalid arguments: {e.message}')
+                                batch.append((tool, tool.parse_arguments(tool_call['arguments'])))
+                            except ToolError:
+                                break
+
+                    threads = []
+
+                    if len(batch) > 1:
+                        if not isinstance(sys.stdout, ThreadStdout):
+                            sys.stdout = ThreadStdout(sys.stdout)
+
+                        threads = [ToolThread(tool, arguments) for tool, arguments in batch]
+
+                        for thread in threads:
+                            thread.start()
+
+                    for i, tool_call in enumerate(tool_calls):
+                        try:
+                            if i < len(batch):
+                                tool, arguments = batch[i]
+                            else:
+                                tool = tools.get(tool_call['name'])
+
+                                if tool is None:
+                                    raise ToolError('Unknown tool.')
+
+                                arguments = tool.parse_arguments(tool_call['arguments'])
 
-                            print('\n', end='', flush=True)
-                            print(f'🔧 {tool.definition["function"]["name"]}', flush=True)
+                            print(f'\n🔧 {tool.name}', flush=True)
 
-                            result = tool(**arguments)
+                            if i < len(threads):
+                                result = threads[i].result()
+                            else:
+                                result = tool(**arguments)
 
-                            messages.append({
-                                'role': 'tool',
-                                'tool_call_id': tool_call['id'],
-                                'content': json.dumps(result),
-                            })
+                            messages.append(tool_message(tool_call['id'], JSON_ENCODER.encode(result)))
                         except (KeyboardInterrupt, EOFError):
                             raise
                         except ToolError as e:
                             print(f'❌ {RED}Error: {e}{RESET}', flush=True)
 
-                            messages.append({
-                                'role': 'tool',
-                                'tool_call_id': tool_call['id'],
-                                'content': json.dumps({'error': f'{e}'}),
-                            })
+                            messages.append(tool_message(tool_call['id'], error_json(f'{e}')))
                         except Exception as e:
                             print(f'❌ {RED}Error: {repr(e)}{RESET}', flush=True)
 
-                            messages.append({
-                                'role': 'tool',
-                                'tool_call_id': tool_call['id'],
-                                'content': json.dumps({'error': repr(e)}),
-                            })
+                            messages.append(tool_message(tool_call['id'], error_json(repr(e))))
             except (KeyboardInterrupt, EOFError):
                 print('\n', end='', flush=True)
                 print(f'🚫 {RED}Interrupted{RESET}')